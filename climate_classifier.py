@@ -1,12 +1,37 @@
 from meteostat import Point
+import numpy as np
 import pandas as pd
 
 import meteostat_functions
 
+# Summer months for the Northern Hemisphere (April to September).
+NORTHERN_SUMMER_MONTHS = np.array([4, 5, 6, 7, 8, 9])
 
-def calculate_koppen_climate(
-    name: str, point: Point, isotherm: int = 0
-) -> pd.DataFrame:
+# Masks selecting the Northern Hemisphere summer and winter months from a full year of data ordered January to December.
+MONTHS = np.arange(1, 13)
+NORTHERN_SUMMER_MASK = np.isin(MONTHS, NORTHERN_SUMMER_MONTHS)
+NORTHERN_WINTER_MASK = ~NORTHERN_SUMMER_MASK
+
+# Possible labels for each part of a Köppen climate classification.
+PRIMARY_LABELS = ("A", "B", "C", "D", "E")
+SECONDARY_LABELS = ("f", "m", "w", "s", "W", "S", "T", "F")
+TERTIARY_LABELS = ("", "h", "k", "a", "b", "c", "d")
+PRIMARY_CODES = {label: code for code, label in enumerate(PRIMARY_LABELS)}
+SECONDARY_CODES = {label: code for code, label in enumerate(SECONDARY_LABELS)}
+TERTIARY_CODES = {label: code for code, label in enumerate(TERTIARY_LABELS)}
+
+# Lookup table from a combined classification code to its label.
+KOPPEN_LABELS = np.array(
+    [
+        primary + secondary + tertiary
+        for primary in PRIMARY_LABELS
+        for secondary in SECONDARY_LABELS
+        for tertiary in TERTIARY_LABELS
+    ]
+)
+
+
+def calculate_koppen_climate(name: str, point: Point, isotherm: int = 0) -> dict:
     """
     Determines the Köppen climate classification for a specified location based on climate normals.
 
@@ -16,53 +41,213 @@ def calculate_koppen_climate(
         isotherm (int, optional): The isotherm value to determine the primary label for temperate or continental climates.
 
     Returns:
-        pd.Series: A Series containing information of interest.
+        dict: A dictionary containing information of interest.
     """
     station, data = meteostat_functions.get_latest_normal(point)
 
-    return pd.concat(
+    return {
+        **calculate_koppen_climate_from_normals(data, isotherm),
+        "Target Location": name,
+        "Nearest Station ID / WMO": station["wmo"],
+        "Nearest Station Name": station["name"],
+    }
+
+
+def calculate_koppen_climate_from_normals(
+    data: pd.DataFrame, isotherm: int = 0
+) -> dict:
+    # print(data)
+
+    # Pull the columns of interest into NumPy arrays once to avoid pandas overhead on such a small frame.
+    (
+        climate_classification,
+        min_monthly_temp,
+        avg_monthly_temp,
+        max_monthly_temp,
+        prcp_threshold,
+        yearly_prcp,
+    ) = _classify_koppen_arrays(
+        data.index.to_numpy(),
+        data["tavg"].to_numpy(),
+        data["prcp"].to_numpy(),
+        isotherm,
+    )
+
+    return {
+        "Köppen climate classification": climate_classification,
+        "Min Monthly Temp": min_monthly_temp,
+        "Avg Monthly Temp": avg_monthly_temp,
+        "Max Monthly Temp": max_monthly_temp,
+        "Precipitation Threshold": prcp_threshold,
+        "Yearly Precipitation": yearly_prcp,
+    }
+
+
+def classify_stations(
+    tavg: np.ndarray, prcp: np.ndarray, isotherm: int = 0
+) -> np.ndarray:
+    """
+    Determines the Köppen climate classification for many stations in a single vectorised pass.
+
+    Args:
+        tavg (np.ndarray): An (N, 12) array of average monthly temperatures, ordered from January to December.
+        prcp (np.ndarray): An (N, 12) array of monthly precipitation, ordered from January to December.
+        isotherm (int, optional): The isotherm value to determine the primary label for temperate or continental climates.
+
+    Returns:
+        np.ndarray: An array of the N climate classification codes, which index into KOPPEN_LABELS.
+    """
+    # Divide by average annual temperature
+    min_monthly_temp = tavg.min(axis=1)
+    avg_monthly_temp = tavg.mean(axis=1)
+    max_monthly_temp = tavg.max(axis=1)
+    yearly_prcp = prcp.sum(axis=1)
+
+    # Calculate mean temperatures for summer and winter.
+    northern_summer_mean = tavg[:, NORTHERN_SUMMER_MASK].mean(axis=1)
+    northern_winter_mean = tavg[:, NORTHERN_WINTER_MASK].mean(axis=1)
+
+    # Determine which period is actually summer based on mean temperature.
+    is_northern = northern_summer_mean >= northern_winter_mean
+    summer_prcp_data = np.where(
+        is_northern[:, np.newaxis],
+        prcp[:, NORTHERN_SUMMER_MASK],
+        prcp[:, NORTHERN_WINTER_MASK],
+    )
+    winter_prcp_data = np.where(
+        is_northern[:, np.newaxis],
+        prcp[:, NORTHERN_WINTER_MASK],
+        prcp[:, NORTHERN_SUMMER_MASK],
+    )
+
+    # Calculate the precipitation threshold that arid climates must lie under.
+    summer_prcp = summer_prcp_data.sum(axis=1)
+    winter_prcp = winter_prcp_data.sum(axis=1)
+    prcp_threshold = 20 * avg_monthly_temp + np.where(
+        summer_prcp >= 0.7 * yearly_prcp,
+        280,
+        np.where(winter_prcp < 0.7 * yearly_prcp, 140, 0),
+    )
+
+    # Check for each of the climate types. The first matching type applies to each station.
+    is_polar = max_monthly_temp < 10  # Step 1: Check for Polar Climates (E).
+    is_arid = yearly_prcp < prcp_threshold  # Step 2: Check for Arid Climates (B).
+    is_tropical = min_monthly_temp >= 18  # Step 3: Check for Tropical Climates (A).
+    climate_types = [is_polar, is_arid, is_tropical]
+
+    # Step 4: Otherwise, Temperate (C) and Continental (D) Climates.
+    is_temperate = min_monthly_temp >= isotherm
+    primary_code = np.select(
+        climate_types,
+        [PRIMARY_CODES["E"], PRIMARY_CODES["B"], PRIMARY_CODES["A"]],
+        default=np.where(is_temperate, PRIMARY_CODES["C"], PRIMARY_CODES["D"]),
+    )
+
+    # Calculate the secondary label of every climate type for all stations, then pick the one that applies.
+    polar_secondary = np.where(
+        max_monthly_temp >= 0, SECONDARY_CODES["T"], SECONDARY_CODES["F"]
+    )
+    arid_secondary = np.where(
+        yearly_prcp < prcp_threshold / 2, SECONDARY_CODES["W"], SECONDARY_CODES["S"]
+    )
+    min_monthly_prcp = prcp.min(axis=1)
+    tropical_secondary = np.select(
+        [min_monthly_prcp >= 60, min_monthly_prcp >= 100 - 0.04 * yearly_prcp],
+        [SECONDARY_CODES["f"], SECONDARY_CODES["m"]],
+        default=SECONDARY_CODES["w"],
+    )
+    driest_summer_month = summer_prcp_data.min(axis=1)
+    wettest_summer_month = summer_prcp_data.max(axis=1)
+    driest_winter_month = winter_prcp_data.min(axis=1)
+    wettest_winter_month = winter_prcp_data.max(axis=1)
+    temperate_secondary = np.select(
         [
-            calculate_koppen_climate_from_normals(data, isotherm),
-            pd.Series(
-                {
-                    "Target Location": name,
-                    "Nearest Station ID / WMO": station["wmo"],
-                    "Nearest Station Name": station["name"],
-                }
-            ),
-        ]
+            wettest_summer_month >= 10 * driest_winter_month,
+            (wettest_winter_month >= 3 * driest_summer_month)
+            & (driest_summer_month < np.where(is_temperate, 40, 30)),
+        ],
+        [SECONDARY_CODES["w"], SECONDARY_CODES["s"]],
+        default=SECONDARY_CODES["f"],
+    )
+    secondary_code = np.select(
+        climate_types,
+        [polar_secondary, arid_secondary, tropical_secondary],
+        default=temperate_secondary,
     )
 
+    # Do the same for the tertiary label.
+    arid_tertiary = np.where(
+        avg_monthly_temp >= 18, TERTIARY_CODES["h"], TERTIARY_CODES["k"]
+    )
+    has_warm_months = (tavg > 10).sum(axis=1) >= 4
+    temperate_tertiary = np.select(
+        [
+            has_warm_months & (max_monthly_temp >= 22),
+            has_warm_months,
+            min_monthly_temp <= -38,
+        ],
+        [TERTIARY_CODES["a"], TERTIARY_CODES["b"], TERTIARY_CODES["d"]],
+        default=TERTIARY_CODES["c"],
+    )
+    tertiary_code = np.select(
+        climate_types,
+        [TERTIARY_CODES[""], arid_tertiary, TERTIARY_CODES[""]],
+        default=temperate_tertiary,
+    )
+
+    # Combine the labels into a single code.
+    koppen_code = primary_code * len(SECONDARY_LABELS) + secondary_code
+    return koppen_code * len(TERTIARY_LABELS) + tertiary_code
 
-def calculate_koppen_climate_from_normals(data: pd.DataFrame, isotherm: int = 0):
-    # print(data)
 
+def _classify_koppen_arrays(
+    months: np.ndarray, tavg: np.ndarray, prcp: np.ndarray, isotherm: int = 0
+) -> tuple[str, float, float, float, float, float]:
+    """
+    Numeric core of the Köppen classifier, operating purely on NumPy arrays.
+
+    Args:
+        months (np.ndarray): The month number (1-12) of each entry.
+        tavg (np.ndarray): The average temperature of each month.
+        prcp (np.ndarray): The total precipitation of each month.
+        isotherm (int, optional): The isotherm value to determine the primary label for temperate or continental climates.
+
+    Returns:
+        tuple: The climate classification followed by the min, average and max monthly temperatures,
+            the precipitation threshold and the yearly precipitation.
+    """
+    # NaN-aware reductions are used to match the pandas behaviour of skipping missing values.
     # Divide by average annual temperature
-    min_monthly_temp = data["tavg"].min()
-    avg_monthly_temp = data["tavg"].mean()
-    max_monthly_temp = data["tavg"].max()
-    yearly_prcp = data["prcp"].sum()
+    min_monthly_temp = _nanmin(tavg)
+    avg_monthly_temp = _nanmean(tavg)
+    max_monthly_temp = _nanmax(tavg)
+    yearly_prcp = np.nansum(prcp)
 
-    # Define summer and winter months for the Northern Hemisphere.
-    northern_summer_months = [4, 5, 6, 7, 8, 9]
-    northern_winter_months = [1, 2, 3, 10, 11, 12]
+    # Define summer months for the Northern Hemisphere. All other months are winter months.
+    # Reuse the precomputed masks when the data covers each month in order.
+    if np.array_equal(months, MONTHS):
+        northern_summer_mask = NORTHERN_SUMMER_MASK
+        northern_winter_mask = NORTHERN_WINTER_MASK
+    else:
+        northern_summer_mask = np.isin(months, NORTHERN_SUMMER_MONTHS)
+        northern_winter_mask = ~northern_summer_mask
 
     # Calculate mean temperatures for summer and winter.
-    northern_summer_mean = data[data.index.isin(northern_summer_months)]["tavg"].mean()
-    northern_winter_mean = data[data.index.isin(northern_winter_months)]["tavg"].mean()
+    northern_summer_mean = _nanmean(tavg[northern_summer_mask])
+    northern_winter_mean = _nanmean(tavg[northern_winter_mask])
 
     # Determine which period is actually summer based on mean temperature.
     if northern_summer_mean >= northern_winter_mean:
-        summer_months, winter_months = northern_summer_months, northern_winter_months
+        summer_mask, winter_mask = northern_summer_mask, northern_winter_mask
     else:
-        summer_months, winter_months = northern_winter_months, northern_summer_months
+        summer_mask, winter_mask = northern_winter_mask, northern_summer_mask
 
-    summer_data: pd.DataFrame = data[data.index.isin(summer_months)]
-    winter_data: pd.DataFrame = data[data.index.isin(winter_months)]
+    summer_prcp_data = prcp[summer_mask]
+    winter_prcp_data = prcp[winter_mask]
 
     # Calculate the precipitation threshold that arid climates must lie under.
-    summer_prcp = summer_data["prcp"].sum()
-    winter_prcp = winter_data["prcp"].sum()
+    summer_prcp = np.nansum(summer_prcp_data)
+    winter_prcp = np.nansum(winter_prcp_data)
     prcp_threshold = 20 * avg_monthly_temp
     if summer_prcp >= 0.7 * yearly_prcp:
         prcp_threshold = prcp_threshold + 280
@@ -89,7 +274,7 @@ def calculate_koppen_climate_from_normals(data: pd.DataFrame, isotherm: int = 0)
             tertiary_label = "k"  # Cold
     elif min_monthly_temp >= 18:  # Step 3: Check for Tropical Climates (A).
         primary_label = "A"
-        min_monthly_prcp = data["prcp"].min()
+        min_monthly_prcp = _nanmin(prcp)
         if min_monthly_prcp >= 60:
             secondary_label = "f"  # Rainforest
         else:
@@ -105,10 +290,10 @@ def calculate_koppen_climate_from_normals(data: pd.DataFrame, isotherm: int = 0)
         primary_label = "C" if min_monthly_temp >= isotherm else "D"
 
         # Check dry season label.
-        driest_summer_month = summer_data["prcp"].min()
-        wettest_summer_month = summer_data["prcp"].max()
-        driest_winter_month = winter_data["prcp"].min()
-        wettest_winter_month = winter_data["prcp"].max()
+        driest_summer_month = _nanmin(summer_prcp_data)
+        wettest_summer_month = _nanmax(summer_prcp_data)
+        driest_winter_month = _nanmin(winter_prcp_data)
+        wettest_winter_month = _nanmax(winter_prcp_data)
         if wettest_summer_month >= 10 * driest_winter_month:
             secondary_label = "w"  # Dry Winter
         elif wettest_winter_month >= 3 * driest_summer_month and driest_summer_month < (
@@ -119,7 +304,7 @@ def calculate_koppen_climate_from_normals(data: pd.DataFrame, isotherm: int = 0)
             secondary_label = "f"  # No Dry Season
 
         # Check temperature label.
-        if data["tavg"].gt(10).sum() >= 4:
+        if (tavg > 10).sum() >= 4:
             if max_monthly_temp >= 22:
                 tertiary_label = "a"  # Hot Summer
             else:
@@ -132,13 +317,26 @@ def calculate_koppen_climate_from_normals(data: pd.DataFrame, isotherm: int = 0)
     # Combine the labels.
     climate_classification = primary_label + secondary_label + tertiary_label
 
-    return pd.Series(
-        {
-            "Köppen climate classification": climate_classification,
-            "Min Monthly Temp": min_monthly_temp,
-            "Avg Monthly Temp": avg_monthly_temp,
-            "Max Monthly Temp": max_monthly_temp,
-            "Precipitation Threshold": prcp_threshold,
-            "Yearly Precipitation": yearly_prcp,
-        }
+    return (
+        climate_classification,
+        min_monthly_temp,
+        avg_monthly_temp,
+        max_monthly_temp,
+        prcp_threshold,
+        yearly_prcp,
     )
+
+
+def _nanmin(values: np.ndarray) -> float:
+    # Return NaN rather than raising when no values are present, like pandas does for a partial year of data.
+    return np.nanmin(values) if np.any(~np.isnan(values)) else np.nan
+
+
+def _nanmax(values: np.ndarray) -> float:
+    # Return NaN rather than raising when no values are present, like pandas does for a partial year of data.
+    return np.nanmax(values) if np.any(~np.isnan(values)) else np.nan
+
+
+def _nanmean(values: np.ndarray) -> float:
+    # Return NaN without warning when no values are present, like pandas does for a partial year of data.
+    return np.nanmean(values) if np.any(~np.isnan(values)) else np.nan
@@ -32,6 +32,8 @@ BOUNDS_START = {
 }
 CENTER_START = [52.15, 9.96]
 ZOOM_START = 10
+# Render the climate data frame as a static, cached HTML table instead of an interactive data frame.
+RENDER_STATIC_CLIMATE_TABLE = False
 
 # Define mappings for variables and months.
 VARIABLE_MAP = {
@@ -59,6 +61,16 @@ MONTH_MAP = {
     12: "Dec",
 }
 
+# Define colour scales for conditional formatting as (rows, colour map, min, max).
+# Use FINAL display names as formatting is applied to the final data frame.
+CLIMATE_GRADIENTS = [
+    (("Max Temp (°C)", "Average Temp (°C)", "Min Temp (°C)"), "coolwarm", -40, 40),
+    (("Precip (mm)",), "Greens", 0, 225),
+    (("Sunshine (hrs)",), "afmhot", 0, 270),
+    (("Wind (km/h)",), "PuBu", 0, 30),
+    (("Pressure (hPa)",), "bwr", 960, 1040),
+]
+
 st.set_page_config(layout="wide")
 
 
@@ -144,11 +156,14 @@ def main():
 
     # Use a feature group passed to the Streamlit map to add markers without re-rendering the map.
     fg = folium.FeatureGroup(name=station_key_to_use)
-    for station_id in st.session_state[station_key_to_use]:
-        marker = st.session_state[station_key_to_use][station_id]
-        # Ignore any stations without data (no generated marker).
-        if marker is not None:
-            fg.add_child(marker)
+    # Ignore any stations without data (no generated marker).
+    features = [
+        feature
+        for feature in st.session_state[station_key_to_use].values()
+        if feature is not None
+    ]
+    if features:
+        fg.add_child(meteostat_functions.create_station_layer(features))
 
     # Carry forward map parameters if possible in case the map must be re-rendered.
     # This happens on occasion, possibly due to Streamlit jank.
@@ -202,89 +217,51 @@ def render_map(center, zoom, fg, data_key_to_use):
 
 
 def render_climate_data_frame(df: pd.DataFrame):
-    readable_df = make_climate_data_frame_readable(df)
+    # Render a static table from cached HTML if interactivity is not needed.
+    if RENDER_STATIC_CLIMATE_TABLE:
+        st.markdown(render_climate_data_frame_html(df), unsafe_allow_html=True)
+        return
 
-    # Apply conditional formatting to the data.
-    # Use FINAL display names as formatting is applied to the final data frame.
-    def climate_style(styler):
-        # Exclude the "Total" column from all formatting.
-        columns_to_format = [col for col in styler.data.columns if col != "Total"]
-
-        # Apply scales to each variable type.
-        temp_vars = [
-            name
-            for name in ["Max Temp (°C)", "Average Temp (°C)", "Min Temp (°C)"]
-            if name in styler.data.index
-        ]
-
-        if temp_vars:
-            styler.background_gradient(
-                cmap="coolwarm",
-                axis=1,
-                subset=pd.IndexSlice[temp_vars, columns_to_format],
-                vmin=-40,
-                vmax=40,
-            )
+    st.dataframe(
+        make_climate_data_frame_readable(df).style.pipe(climate_style),
+        height=400,
+        use_container_width=True,
+    )
 
-        if "Precip (mm)" in styler.data.index:
-            styler.background_gradient(
-                cmap="Greens",
-                axis=1,
-                subset=pd.IndexSlice[["Precip (mm)"], columns_to_format],
-                vmin=0,
-                vmax=225,
-            )
 
-        if "Sunshine (hrs)" in styler.data.index:
-            styler.background_gradient(
-                cmap="afmhot",
-                axis=1,
-                subset=pd.IndexSlice[["Sunshine (hrs)"], columns_to_format],
-                vmin=0,
-                vmax=270,
-            )
+@st.cache_data
+def render_climate_data_frame_html(df: pd.DataFrame) -> str:
+    # Cache the styled HTML so that clicking the same marker again does not redo the styling.
+    return make_climate_data_frame_readable(df).style.pipe(climate_style).to_html()
 
-        if "Wind (km/h)" in styler.data.index:
-            styler.background_gradient(
-                cmap="PuBu",
-                axis=1,
-                subset=pd.IndexSlice[["Wind (km/h)"], columns_to_format],
-                vmin=0,
-                vmax=30,
-            )
 
-        if "Pressure (hPa)" in styler.data.index:
+def climate_style(styler):
+    # Apply conditional formatting to the data.
+    # Exclude the "Total" column from all formatting.
+    columns_to_format = [col for col in styler.data.columns if col != "Total"]
+
+    # Apply scales to each variable type present in the data.
+    rows_in_data = set(styler.data.index)
+    for rows, cmap, vmin, vmax in CLIMATE_GRADIENTS:
+        rows_to_format = [row for row in rows if row in rows_in_data]
+        if rows_to_format:
             styler.background_gradient(
-                cmap="bwr",
+                cmap=cmap,
                 axis=1,
-                subset=pd.IndexSlice[["Pressure (hPa)"], columns_to_format],
-                vmin=960,
-                vmax=1040,
+                subset=pd.IndexSlice[rows_to_format, columns_to_format],
+                vmin=vmin,
+                vmax=vmax,
             )
 
-        # Show data to one decimal place.
-        styler.format("{:.1f}")
-        return styler
-
-    st.dataframe(
-        readable_df.style.pipe(climate_style),
-        height=400,
-        use_container_width=True,
-    )
+    # Show data to one decimal place.
+    styler.format("{:.1f}")
+    return styler
 
 
 @st.cache_data
 def make_climate_data_frame_readable(df):
-    # Add columns for any missing months.
-    df = df.reindex(range(1, 13)).reset_index()
-
-    # Transpose the data frame to match the orientation of those on Wikipedia.
-    df_transposed = (
-        df.reset_index()
-        .melt(id_vars="month")
-        .pivot(index="variable", columns="month")
-        .droplevel(0, axis=1)
-    )
+    # Add columns for any missing months and transpose the data frame to match the orientation of those on Wikipedia.
+    df_transposed = df.reindex(range(1, 13)).T
 
     # Change the order of rows to match that on Wikipedia.
     df_ordered = df_transposed.loc[
@@ -1,10 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import cache, lru_cache
+from threading import Lock
 from dateutil.relativedelta import relativedelta
 from meteostat import Monthly, Normals, Point, Stations
+import numpy as np
 import pandas as pd
 import folium
 import streamlit as st
-from folium.plugins import BeautifyIcon
 
 import climate_classifier
 
@@ -46,74 +49,157 @@ KOPPEN_COLOURS = {
     None: "#CCCCCC",  # For stations without normals
 }
 
+# Time in seconds to keep fetched Meteostat data cached between reruns.
+FETCH_CACHE_TTL = 24 * 60 * 60
+# Time in seconds to keep Meteostat's local copies of normals files before downloading them again.
+# Normals only change when a new reference period is published, so they can be kept far longer than the default day.
+Normals.max_age = 30 * 24 * 60 * 60
+# Number of per-station normals to keep in memory for quick reuse. Normals only change once per reference period.
+NORMALS_CACHE_SIZE = 2048
+# Number of decimal places to round map bounds to when caching station fetches.
+STATION_BOUNDS_PRECISION = 3
+# Maximum number of stations to fetch data for concurrently.
+FETCH_WORKERS = 16
+# Thread pool shared by all network-bound fetches so that threads are reused across map updates.
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+# Lock guarding the shared station catalogue, as Stations.nearby writes a distance column into it.
+STATIONS_LOCK = Lock()
+
 
 def update_markers(marker_array, data_array, bounds):
-    # Fetch stations and generate markers for any stations not yet added.
-    for _, station in fetch_stations(bounds).iterrows():
-        station_id = station.name
-        if station_id not in marker_array:
-            # Try to fetch either normal or monthly data.
-            normals = None
-            try:
-                if not st.session_state.use_custom_date_range:
-                    normals = get_latest_normal_by_station_id(station_id)
-                else:
-                    normals = get_monthly_as_normal(
-                        station_id,
-                        datetime.combine(
-                            st.session_state.start_date, datetime.min.time()
-                        ),
-                        datetime.combine(
-                            st.session_state.end_date - relativedelta(days=1),
-                            datetime.min.time(),
-                        ),
-                    )
-            except Exception:
-                print(
-                    f"Failed to get normal / monthly data for station with ID {station_id}."
-                )
-
-            # Store all non-null normals, but only calculate Köppen for normals with full average temperature and precipitation data.
-            if normals is not None:
-                # Set popup text and marker colour.
-                popup = (
-                    f"<b>{station['name']}</b><br>Elevation: {station['elevation']}m"
-                )
-                color = KOPPEN_COLOURS[None]
-
-                # Turn sunshine data into hours rather than minutes.
-                if "tsun" in normals:
-                    normals["tsun"] = normals["tsun"] / 60
-
-                data_array[(station["latitude"], station["longitude"])] = normals
-                if (
-                    not normals[["tavg", "prcp"]].isna().any(axis=1).any()
-                    and len(normals.index) == 12
-                ):
-                    koppen = climate_classifier.calculate_koppen_climate_from_normals(
-                        normals
-                    )
-                    climate_type = koppen.iloc[0]
-                    if isinstance(climate_type, str):
-                        popup += f"\nKöppen: {climate_type}"
-                        color = KOPPEN_COLOURS[climate_type]
-
-                marker_array[station_id] = folium.Marker(
-                    location=[station["latitude"], station["longitude"]],
-                    popup=popup,
-                    icon=BeautifyIcon(
-                        icon="info",
-                        icon_shape="circle",
-                        background_color=color,
-                        border_color="black",
-                        text_color="white",
+    # Fetch stations and collect any stations not yet added.
+    # Use plain dictionaries per station rather than building a pandas Series for each row.
+    new_stations = {
+        station_id: station
+        for station_id, station in fetch_stations(bounds).to_dict("index").items()
+        if station_id not in marker_array
+    }
+
+    # Read the date range on the main thread as session state is not available to worker threads.
+    use_custom_date_range = st.session_state.use_custom_date_range
+    start, end = None, None
+    if use_custom_date_range:
+        start = datetime.combine(st.session_state.start_date, datetime.min.time())
+        end = datetime.combine(
+            st.session_state.end_date - relativedelta(days=1), datetime.min.time()
+        )
+
+    # Fetch data for all new stations concurrently as the work is network-bound.
+    payloads = list(
+        FETCH_EXECUTOR.map(
+            lambda station_id: _fetch_station_payload(
+                station_id, use_custom_date_range, start, end
+            ),
+            new_stations,
+        )
+    )
+
+    # Store all non-null normals, but only calculate Köppen for normals with full average temperature and precipitation data.
+    fetched_normals = {}
+    for station_id, normals in payloads:
+        if normals is not None:
+            station = new_stations[station_id]
+
+            # Turn sunshine data into hours rather than minutes.
+            # Build a new data frame rather than modifying the cached one in place.
+            if "tsun" in normals:
+                normals = normals.assign(tsun=normals["tsun"] / 60)
+
+            data_array[(station["latitude"], station["longitude"])] = normals
+            fetched_normals[station_id] = normals
+        else:
+            # If the station has no data or an exception occurred, do not add a marker.
+            # Set the key to None in the dictionary so that it is not processed in future.
+            marker_array[station_id] = None
+
+    # Classify all stations with complete data together in a single pass.
+    complete_station_ids = [
+        station_id
+        for station_id, normals in fetched_normals.items()
+        if len(normals.index) == 12
+        and not normals["tavg"].hasnans
+        and not normals["prcp"].hasnans
+    ]
+    koppen_codes = {}
+    if complete_station_ids:
+        koppen_codes = dict(
+            zip(
+                complete_station_ids,
+                climate_classifier.classify_stations(
+                    np.stack(
+                        [
+                            fetched_normals[station_id]["tavg"].to_numpy()
+                            for station_id in complete_station_ids
+                        ]
+                    ),
+                    np.stack(
+                        [
+                            fetched_normals[station_id]["prcp"].to_numpy()
+                            for station_id in complete_station_ids
+                        ]
                     ),
-                    # icon=folium.Icon(color="blue", icon="cloud")
-                )
-            else:
-                # If the station has no data or an exception occurred, do not add a marker.
-                # Set the key to None in the dictionary so that it is not processed in future.
-                marker_array[station_id] = None
+                ).tolist(),
+            )
+        )
+
+    # Generate markers on the main thread.
+    for station_id in fetched_normals:
+        station = new_stations[station_id]
+
+        # Set popup text and marker colour.
+        popup = f"<b>{station['name']}</b><br>Elevation: {station['elevation']}m"
+        color = KOPPEN_COLOURS[None]
+        if station_id in koppen_codes:
+            koppen_code = koppen_codes[station_id]
+            popup += f"\nKöppen: {climate_classifier.KOPPEN_LABELS[koppen_code]}"
+            color = _koppen_code_colours()[koppen_code]
+
+        # Store the marker as a GeoJSON feature so that all markers can be drawn from a single layer.
+        marker_array[station_id] = {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [station["longitude"], station["latitude"]],
+            },
+            "properties": {"popup": popup, "color": str(color)},
+        }
+
+
+def create_station_layer(features: list) -> folium.GeoJson:
+    """
+    Creates a single map layer drawing a circle marker for each station.
+
+    Args:
+        features (list): The GeoJSON point features of the stations, with popup and color properties.
+
+    Returns:
+        folium.GeoJson: A layer containing all of the station markers.
+    """
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        # Keep the radius at most 10 pixels so that Leaflet reports the marker location on click.
+        marker=folium.CircleMarker(
+            radius=8, color="black", weight=1, fill=True, fill_opacity=1
+        ),
+        style_function=lambda feature: {"fillColor": feature["properties"]["color"]},
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+    )
+
+
+def _fetch_station_payload(
+    station_id: int, use_custom_date_range: bool, start: datetime, end: datetime
+) -> tuple[int, pd.DataFrame]:
+    # Try to fetch either normal or monthly data.
+    normals = None
+    try:
+        if not use_custom_date_range:
+            normals = get_latest_normal_by_station_id(station_id)
+        else:
+            normals = get_monthly_as_normal(station_id, start, end)
+    except Exception:
+        print(f"Failed to get normal / monthly data for station with ID {station_id}.")
+
+    return station_id, normals
 
 
 def fetch_stations(bounds: dict):
@@ -123,16 +209,27 @@ def fetch_stations(bounds: dict):
     top_left = (bounds["_northEast"]["lat"], bounds["_southWest"]["lng"])
     bottom_right = (bounds["_southWest"]["lat"], bounds["_northEast"]["lng"])
 
-    # Do an initial fetch of stations.
-    limit = st.session_state.fetch_limit
-    stations = Stations().bounds(top_left, bottom_right).fetch(limit)
-    if not stations.empty:
-        # Use the number of stations retrieved to try a sampled fetch.
-        # The limit in the sampled fetch must not exceed the number of stations, hence the safety calculation.
-        safe_sample = min(limit, len(stations))
-        return Stations().bounds(top_left, bottom_right).fetch(safe_sample, sample=True)
+    # Round the bounds so that slight pan jitter still hits the cache.
+    stations = _fetch_stations_in_bounds(
+        tuple(round(coordinate, STATION_BOUNDS_PRECISION) for coordinate in top_left),
+        tuple(
+            round(coordinate, STATION_BOUNDS_PRECISION) for coordinate in bottom_right
+        ),
+    )
+    if stations.empty:
+        return pd.DataFrame()
 
-    return pd.DataFrame()
+    # Draw a new sample on every call so that repeated loads of the same view keep adding stations.
+    # The sample size must not exceed the number of stations, hence the safety calculation.
+    safe_sample = min(st.session_state.fetch_limit, len(stations))
+    return stations.sample(safe_sample)
+
+
+@st.cache_data(ttl=FETCH_CACHE_TTL)
+def _fetch_stations_in_bounds(top_left: tuple, bottom_right: tuple) -> pd.DataFrame:
+    # Only cache the deterministic bounds filter, as the sampling must differ between calls.
+    with STATIONS_LOCK:
+        return _load_stations().bounds(top_left, bottom_right).fetch()
 
 
 def get_latest_normal(point: Point) -> {pd.DataFrame, pd.DataFrame}:
@@ -151,11 +248,19 @@ def get_latest_normal(point: Point) -> {pd.DataFrame, pd.DataFrame}:
         ValueError: If no nearby stations with available normals data are found.
     """
     # Fetch nearby stations.
-    nearby_stations = Stations().nearby(point._lat, point._lon).fetch(10)
+    nearby_stations = fetch_nearby_stations(point._lat, point._lon)
+
+    # Probe all nearby stations for normals data concurrently.
+    probes = [
+        FETCH_EXECUTOR.submit(_fetch_normals, station_id)
+        for station_id in nearby_stations.index
+    ]
 
-    # Find the nearest station with available normals data.
-    for station_id in nearby_stations.index:
-        if not Normals(station_id).fetch().empty:
+    # Find the nearest station with available normals data and cancel any probes not yet started.
+    for station_id, probe in zip(nearby_stations.index, probes):
+        if not probe.result().empty:
+            for pending_probe in probes:
+                pending_probe.cancel()
             break
     else:
         raise ValueError("No nearby stations with available normals data found.")
@@ -163,24 +268,86 @@ def get_latest_normal(point: Point) -> {pd.DataFrame, pd.DataFrame}:
     return nearby_stations.loc[station_id], get_latest_normal_by_station_id(station_id)
 
 
+@lru_cache(maxsize=NORMALS_CACHE_SIZE)
 def get_latest_normal_by_station_id(station_id: int) -> {pd.DataFrame}:
     # Fetch normals data.
-    data = Normals(station_id).fetch()
+    data = _fetch_normals(station_id)
     if data.empty:
         return
 
-    # Extract the start and end year of the latest normal and return just this part of the normals data.
-    latest_year_index = -1
-    start_year = data.index.levels[0][latest_year_index]
-    end_year = data.index.levels[1][latest_year_index]
-    return data.loc[(start_year, end_year)]
+    # Find the rows of the latest normal by its end year and return just this part of the normals data.
+    # Index levels are sorted independently, so they cannot be used to pair up start and end years.
+    end_years = data.index.get_level_values("end").to_numpy()
+    return data.iloc[end_years == end_years.max()].droplevel(["start", "end"])
 
 
 def get_monthly_as_normal(
     station_id: int, start: datetime, end: datetime
 ) -> pd.DataFrame:
     # Group monthly data by the month number and get the mean.
-    monthly = Monthly(station_id, start, end).fetch()
+    monthly = _fetch_monthly(station_id, start, end)
     if monthly.empty:
         return
-    return monthly.groupby(monthly.index.month).mean()
+
+    # Use bincount over the fixed month key space rather than a pandas groupby.
+    months = monthly.index.month.to_numpy()
+    means = {}
+    for column in monthly.columns:
+        values = monthly[column].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        sums = np.bincount(months[valid], weights=values[valid], minlength=13)[1:]
+        counts = np.bincount(months[valid], minlength=13)[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means[column] = sums / counts
+
+    # Only keep months that appear in the data, as a groupby would.
+    months_present = np.bincount(months, minlength=13)[1:] > 0
+    return pd.DataFrame(means, index=pd.Index(range(1, 13), name=monthly.index.name))[
+        months_present
+    ]
+
+
+@st.cache_data(ttl=FETCH_CACHE_TTL)
+def fetch_nearby_stations(lat: float, lon: float, limit: int = 10) -> pd.DataFrame:
+    """
+    Fetches the weather stations nearest to a location, ordered by distance.
+
+    Args:
+        lat (float): The latitude of the location.
+        lon (float): The longitude of the location.
+        limit (int, optional): The maximum number of stations to fetch.
+
+    Returns:
+        pd.DataFrame: A DataFrame of the nearest stations.
+    """
+    with STATIONS_LOCK:
+        stations = _load_stations().nearby(lat, lon)
+    return stations.fetch(limit)
+
+
+@st.cache_resource(ttl=FETCH_CACHE_TTL)
+def _load_stations() -> Stations:
+    # Creating Stations reads the whole station catalogue, so share a single instance across calls and sessions.
+    return Stations()
+
+
+@st.cache_data(ttl=FETCH_CACHE_TTL)
+def _fetch_normals(station_id: int) -> pd.DataFrame:
+    return Normals(station_id).fetch()
+
+
+@st.cache_data(ttl=FETCH_CACHE_TTL)
+def _fetch_monthly(station_id: int, start: datetime, end: datetime) -> pd.DataFrame:
+    return Monthly(station_id, start, end).fetch()
+
+
+@cache
+def _koppen_code_colours() -> np.ndarray:
+    # Lookup table from a Köppen classification code to its colour, falling back to the default for unlisted types.
+    # Built on first use as climate_classifier imports this module and may not be initialised yet at import time.
+    return np.array(
+        [
+            KOPPEN_COLOURS.get(label, KOPPEN_COLOURS[None])
+            for label in climate_classifier.KOPPEN_LABELS
+        ]
+    )
@@ -1,13 +1,33 @@
+import calendar
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import matplotlib.pyplot as plt
-from meteostat import Hourly, Point, Stations
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+from meteostat import Hourly, Point
+import numpy as np
 import pandas as pd
 
 import climate_classifier
 import meteostat_functions
 
+# Matplotlib is only imported where figures are created to keep importing this module light.
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
 
-def plot_normal(name: str, point: Point, ax: plt.Axes):
+# Number of hourly data sets to keep in memory for reuse.
+HOURLY_CACHE_SIZE = 64
+# Hourly columns used by the rain hours analysis and the precision to keep them in.
+HOURLY_COLUMNS = ["prcp", "temp"]
+HOURLY_DTYPE = "float32"
+# Load the station files of hourly fetches concurrently. Meteostat loads them while constructing Hourly.
+Hourly.threads = meteostat_functions.FETCH_WORKERS
+
+# Directory the climatographs of print_koppen_data are saved to by default, one file per location.
+KOPPEN_FIGURE_DIRECTORY = "koppen_figures"
+
+
+def plot_normal(name: str, point: Point, ax: "plt.Axes"):
     """
     Plots the normal weather data for a specified location.
 
@@ -21,52 +41,89 @@ def plot_normal(name: str, point: Point, ax: plt.Axes):
     """
     # Retrieve the latest normal.
     station, latest_normal = meteostat_functions.get_latest_normal(point)
+    render_normal(name, station["name"], latest_normal, ax)
+
+
+def render_normal(
+    name: str, station_name: str, latest_normal: pd.DataFrame, ax: "plt.Axes"
+):
+    """
+    Plots already fetched normal weather data for a specified location.
 
+    Args:
+        name (str): The name of the location.
+        station_name (str): The name of the station the normals data belongs to.
+        latest_normal (pd.DataFrame): The latest normals data of the station.
+        ax (plt.Axes): The matplotlib Axes object on which to plot the data.
+
+    Returns:
+        None
+    """
     # Calculate yearly precipitation and mean temperature.
     total_precipitation = latest_normal["prcp"].sum()
     avg_temperature = latest_normal["tavg"].mean()
 
+    # Convert the months to plain positions once for all plots.
+    months = latest_normal.index.to_numpy()
+
+    # Map the padded temperature range onto the precipitation range so both can share one Axes.
+    temperatures = latest_normal[["tmin", "tavg", "tmax"]].to_numpy()
+    min_temperature, max_temperature = np.nanmin(temperatures), np.nanmax(temperatures)
+    padding = max(max_temperature - min_temperature, 1) * 0.05
+    min_temperature -= padding
+    max_temperature += padding
+    max_precipitation = max(np.nanmax(latest_normal["prcp"].to_numpy()), 1)
+    scale = max_precipitation / (max_temperature - min_temperature)
+
+    def temperature_to_precipitation(temperature):
+        return (temperature - min_temperature) * scale
+
+    def precipitation_to_temperature(precipitation):
+        return precipitation / scale + min_temperature
+
     # Plot precipitation data on the primary y-axis.
-    ax.bar(
-        latest_normal.index,
+    bars = ax.bar(
+        months,
         latest_normal["prcp"],
         label="Precipitation",
         color="tab:blue",
     )
     ax.set_ylabel(f"Precipitation (mm)\nTotal: {total_precipitation:.2f} mm")
 
-    # Create a secondary y-axis and plot temperature data on it. This renders it above precipitation.
-    ax2 = ax.twinx()
-    ax2.plot(
-        latest_normal.index, latest_normal["tmax"], label="Max Temp", color="tab:red"
-    )
-    ax2.plot(
-        latest_normal.index, latest_normal["tavg"], label="Avg Temp", color="tab:orange"
-    )
-    ax2.plot(
-        latest_normal.index, latest_normal["tmin"], label="Min Temp", color="tab:cyan"
-    )
-    ax2.set_ylabel(f"Temperature (°C)\nAvg Temp: {avg_temperature:.2f} °C")
-    ax2.set_xlabel("Month")
-    ax2.set_title(
-        f"Weather Data for {station['name']} (nearest normals station to {name})"
-    )
+    # Plot the scaled temperature data on the same Axes. Lines render above the precipitation bars.
+    lines = [
+        ax.plot(
+            months,
+            temperature_to_precipitation(latest_normal[column]),
+            label=label,
+            color=color,
+        )[0]
+        for column, label, color in (
+            ("tmax", "Max Temp", "tab:red"),
+            ("tavg", "Avg Temp", "tab:orange"),
+            ("tmin", "Min Temp", "tab:cyan"),
+        )
+    ]
+    ax.set_xticks(months, [calendar.month_abbr[month] for month in months])
+    ax.set_xlabel("Month")
+    ax.set_title(f"Weather Data for {station_name} (nearest normals station to {name})")
 
-    # Swap the y-axis ticks and label positions to have temperature on the left.
+    # Label the temperatures on a secondary y-axis, keeping temperature on the left.
     ax.yaxis.tick_right()
-    ax2.yaxis.tick_left()
     ax.yaxis.set_label_position("right")
-    ax2.yaxis.set_label_position("left")
+    temperature_axis = ax.secondary_yaxis(
+        "left",
+        functions=(precipitation_to_temperature, temperature_to_precipitation),
+    )
+    temperature_axis.set_ylabel(f"Temperature (°C)\nAvg Temp: {avg_temperature:.2f} °C")
 
-    # Combine legends from both y-axes.
-    lines, labels = ax.get_legend_handles_labels()
-    bars, bar_labels = ax2.get_legend_handles_labels()
-    ax.legend(lines + bars, labels + bar_labels, loc="upper left")
+    # Combine the precipitation and temperature entries in one legend.
+    ax.legend(handles=[bars, *lines], loc="upper left")
 
 
 def calculate_rain_hours(
     name: str, point: Point, start: datetime, end: datetime, threshold: float = 0
-):
+) -> dict:
     """
     Calculates the average number of rain hours per day for a given location over a specified period.
 
@@ -78,47 +135,144 @@ def calculate_rain_hours(
         threshold (float, optional): The precipitation threshold to consider rain hours.
 
     Returns:
-        pd.Series: A Series containing information of interest.
+        dict: A dictionary containing information of interest.
 
     Raises:
         ValueError: If no nearby stations with available hourly data are found.
     """
     # Fetch nearby stations.
-    nearby_stations = Stations().nearby(point._lat, point._lon).fetch(10)
+    nearby_stations = meteostat_functions.fetch_nearby_stations(point._lat, point._lon)
 
-    # Find the nearest station with available hourly data.
+    # Find the nearest station with available hourly data and keep its data.
     for station_id in nearby_stations.index:
-        if not Hourly(station_id, start, end).fetch().empty:
+        data = _fetch_hourly(station_id, start, end)
+        if not data.empty:
             break
     else:
         raise ValueError("No nearby stations with available hourly data found.")
 
-    # Fetch hourly data.
-    data = Hourly(station_id, start, end).fetch()
+    return summarise_rain_hours(
+        name, station_id, nearby_stations.at[station_id, "name"], data, threshold
+    )
+
 
-    # Calculate mean rain hours.
-    hours = data["prcp"].notnull().sum()
-    rain_hours = data["prcp"].gt(threshold).sum()
+def summarise_rain_hours(
+    name: str,
+    station_id: str,
+    station_name: str,
+    data: pd.DataFrame,
+    threshold: float = 0,
+) -> dict:
+    """
+    Summarises already fetched hourly data into rain hours statistics.
+
+    Args:
+        name (str): The name of the location.
+        station_id (str): The ID of the station the hourly data belongs to.
+        station_name (str): The name of the station the hourly data belongs to.
+        data (pd.DataFrame): The hourly data of the station.
+        threshold (float, optional): The precipitation threshold to consider rain hours.
+
+    Returns:
+        dict: A dictionary containing information of interest.
+    """
+    # Calculate mean rain hours, reusing one mask of the recorded hours for all precipitation statistics.
+    prcp = data["prcp"].to_numpy(dtype=HOURLY_DTYPE)
+    recorded = prcp[~np.isnan(prcp)]
+    hours = np.int64(recorded.size)
+    rain_hours = np.count_nonzero(recorded > threshold)
+    total_precipitation = recorded.sum(dtype=np.float64)
     num_days = hours / 24
     avg_rain_hours_per_day = rain_hours / num_days
 
-    # Create a pandas Series to return the results.
-    return pd.Series(
-        {
-            "Target Location": name,
-            "Nearest Station ID": station_id,
-            "Nearest Station Name": nearby_stations.loc[station_id]["name"],
-            "Average Rain Hours/Day": avg_rain_hours_per_day,
-            "Total Precipitation": data["prcp"].sum(),
-            "Average Temperature": data["temp"].mean(),
-            "Total Hours": hours,
-            "Rain Hours": rain_hours,
-            "Number of Days": num_days,
-        }
-    )
+    # Return the results as a plain record so several can be combined into a DataFrame at once.
+    return {
+        "Target Location": name,
+        "Nearest Station ID": station_id,
+        "Nearest Station Name": station_name,
+        "Average Rain Hours/Day": avg_rain_hours_per_day,
+        "Total Precipitation": total_precipitation,
+        "Average Temperature": _nanmean(data["temp"].to_numpy(dtype=HOURLY_DTYPE)),
+        "Total Hours": hours,
+        "Rain Hours": rain_hours,
+        "Number of Days": num_days,
+    }
+
+
+def _nanmean(values: np.ndarray) -> float:
+    # Skip missing values like pandas does, without warning when there are none left.
+    values = values[~np.isnan(values)]
+    return values.mean(dtype=np.float64) if values.size else np.nan
 
 
-def print_koppen_data():
+@lru_cache(maxsize=HOURLY_CACHE_SIZE)
+def _fetch_hourly(station_id: str, start: datetime, end: datetime) -> pd.DataFrame:
+    # Meteostat also keeps the downloaded files in its own cache directory, so reruns within its cache age stay local.
+    return _crop_hourly(Hourly(station_id, start, end).fetch())
+
+
+def _crop_hourly(data: pd.DataFrame) -> pd.DataFrame:
+    # Only keep the analysed columns in single precision, halving the memory the reductions read.
+    if data.empty:
+        return data
+    return data[HOURLY_COLUMNS].astype(HOURLY_DTYPE, copy=False)
+
+
+def fetch_hourly_in_bulk(
+    points: dict[str, Point], start: datetime, end: datetime
+) -> dict[str, tuple[str, str, pd.DataFrame]]:
+    """
+    Fetches the hourly data for several locations in a single Meteostat request.
+
+    Each location uses the nearest of its nearby stations listing hourly data in the station inventory.
+    Locations without such a station or whose station returns no data for the period are left out.
+
+    Args:
+        points (dict[str, Point]): The geographical points of the locations by name.
+        start (datetime): The start date of the period to fetch.
+        end (datetime): The end date of the period to fetch.
+
+    Returns:
+        dict: The nearest hourly station's ID, name and hourly data by location name.
+    """
+    # Pick the nearest station listing hourly data for each location, from the same stations calculate_rain_hours probes.
+    stations = {}
+    for name, point in points.items():
+        nearby_stations = meteostat_functions.fetch_nearby_stations(
+            point._lat, point._lon
+        )
+        hourly_stations = nearby_stations.index[nearby_stations["hourly_start"].notna()]
+        if not hourly_stations.empty:
+            station_id = hourly_stations[0]
+            stations[name] = (station_id, nearby_stations.at[station_id, "name"])
+    if not stations:
+        return {}
+
+    # Fetch the data of all picked stations at once.
+    station_ids = list(dict.fromkeys(station_id for station_id, _ in stations.values()))
+    data = _crop_hourly(Hourly(station_ids, start, end).fetch())
+    if data.empty:
+        return {}
+
+    # Meteostat drops the station level when only a single station is requested.
+    if len(station_ids) == 1:
+        data = pd.concat({station_ids[0]: data}, names=["station"])
+
+    # Split the data back up per station.
+    data_by_station = {
+        station_id: station_data.droplevel("station")
+        for station_id, station_data in data.groupby(level="station")
+    }
+    return {
+        name: (station_id, station_name, data_by_station[station_id])
+        for name, (station_id, station_name) in stations.items()
+        if station_id in data_by_station
+    }
+
+
+def print_koppen_data(
+    show: bool = False, output_directory: str = KOPPEN_FIGURE_DIRECTORY
+):
     # Set time period for dailies, monthlies or yearlies.
     startYear, endYear = 2023, 2023
     start = datetime(startYear, 1, 1, 0, 0, 0)
@@ -155,30 +309,93 @@ def print_koppen_data():
         "Byrd (EF)": Point(-80.0147, -119.5656),
     }
 
-    # Create climatographs.
-    fig, axs = plt.subplots(len(locations), 1, figsize=(10, 8), sharex=True)
-    i = 0
-    for name, point in locations.items():
-        # Create the climatographs from normals data.
-        plot_normal(name, point, axs[i])
-        i = i + 1
-    # Plot the climatographs.
-    plt.tight_layout()
-    plt.show()
+    # Fetch the hourly data for all locations in one bulk request.
+    hourly_data = fetch_hourly_in_bulk(locations, start, end)
+
+    # Fetch the remaining data for every location concurrently as the work is network-bound.
+    with ThreadPoolExecutor(max_workers=meteostat_functions.FETCH_WORKERS) as executor:
+        location_data = list(
+            executor.map(
+                lambda location: fetch_location_data(
+                    *location, start, end, hourly_data.get(location[0])
+                ),
+                locations.items(),
+            )
+        )
+
+    import matplotlib.pyplot as plt
+
+    # Render off-screen unless the climatographs should be shown, avoiding the start-up cost of a GUI backend.
+    if not show:
+        plt.switch_backend("Agg")
+
+    # Create climatographs on the main thread once all data has been fetched, saving one image per location.
+    # The constrained layout is applied while drawing, so no separate layout pass is needed before saving.
+    output_path = Path(output_directory)
+    output_path.mkdir(parents=True, exist_ok=True)
+    fig, ax = plt.subplots(figsize=(10, 4), layout="constrained")
+    for name, (station, latest_normal, _, _) in zip(locations, location_data):
+        # Create the climatograph from normals data.
+        render_normal(name, station["name"], latest_normal, ax)
+        fig.savefig(output_path / f"{name}.png", dpi=100)
+        if show:
+            # Keep the finished figure open to display it and continue on a new one.
+            fig, ax = plt.subplots(figsize=(10, 4), layout="constrained")
+        else:
+            # Reuse the figure for the next location rather than creating a new one.
+            ax.clear()
+    plt.close(fig)
+    if show:
+        plt.show()
 
     # Analyse rain hours and climate type.
-    rain_results, koppen_results = [], []
-    for name, point in locations.items():
-        # Rain data.
-        rain_results.append(calculate_rain_hours(name, point, start, end))
-        # Köppen climate classification.
-        koppen_results.append(climate_classifier.calculate_koppen_climate(name, point))
+    rain_results = [rain_result for _, _, rain_result, _ in location_data]
+    koppen_results = [koppen_result for _, _, _, koppen_result in location_data]
     # Combine each set of results into a single DataFrame and print it.
-    rain_results_df = pd.DataFrame(rain_results)
+    rain_results_df = pd.DataFrame.from_records(rain_results)
     print("Rain Hours:")
     print(rain_results_df)
     print("----------")
-    koppen_results_df = pd.DataFrame(koppen_results)
+    koppen_results_df = pd.DataFrame.from_records(koppen_results)
     print("Climate Classification:")
     print(koppen_results_df)
     print("----------")
+
+
+def fetch_location_data(
+    name: str,
+    point: Point,
+    start: datetime,
+    end: datetime,
+    hourly: tuple[str, str, pd.DataFrame] | None = None,
+) -> tuple[pd.Series, pd.DataFrame, dict, dict]:
+    """
+    Fetches all data needed by print_koppen_data for a single location.
+
+    Args:
+        name (str): The name of the location.
+        point (Point): The geographical point (latitude and longitude) of the location.
+        start (datetime): The start date of the period for rain hours analysis.
+        end (datetime): The end date of the period for rain hours analysis.
+        hourly (tuple[str, str, pd.DataFrame], optional): Already fetched hourly station ID, name and data to reuse.
+
+    Returns:
+        tuple: The nearest normals station, its latest normal, the rain hours results and the Köppen results.
+    """
+    station, latest_normal = meteostat_functions.get_latest_normal(point)
+
+    # Reuse bulk-fetched hourly data if available, otherwise probe the nearby stations.
+    if hourly is None:
+        rain_result = calculate_rain_hours(name, point, start, end)
+    else:
+        rain_result = summarise_rain_hours(name, *hourly)
+
+    # Classify the normal already fetched rather than searching for it again.
+    koppen_result = {
+        **climate_classifier.calculate_koppen_climate_from_normals(latest_normal),
+        "Target Location": name,
+        "Nearest Station ID / WMO": station["wmo"],
+        "Nearest Station Name": station["name"],
+    }
+
+    return station, latest_normal, rain_result, koppen_result